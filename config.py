@@ -9,3 +9,8 @@ login_token = os.getenv("login_token") #school
 password_token = os.getenv("password_token")
 GOOGLE_SHEETS_CREDS = os.getenv("GOOGLE_SHEETS_CREDS")
 SPREADSHEET_KEY = os.getenv("SPREADSHEET_KEY")
+CAMPUS_IDS = [campus_id.strip() for campus_id in os.getenv("CAMPUS_IDS", "").split(",") if campus_id.strip()]
+SLOW_UPDATE_MS = int(os.getenv("SLOW_UPDATE_MS", "1000"))
+SHEETS_READS_PER_MINUTE = int(os.getenv("SHEETS_READS_PER_MINUTE", "60"))
+SHEETS_WRITES_PER_MINUTE = int(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+DIGEST_TIME = os.getenv("DIGEST_TIME", "21:00")
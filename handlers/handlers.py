@@ -1,15 +1,28 @@
+import asyncio
 import re
+from bisect import bisect_left
 from html import escape
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
+from aiogram.types import (
+    Message, CallbackQuery, InlineKeyboardMarkup, InlineQuery,
+    InlineQueryResultArticle, InputTextMessageContent
+)
 from utils.states import Form
 from utils.helpers import (
     menu_keyboard, links_keyboard, registration_keyboard,
     re_registration_keyboard, cancel_keyboard, broadcast_decision_keyboard,
     check_ban, send_menu, send_media_preview, is_user_banned,
-    add_banned_user, remove_banned_user
+    add_banned_user, remove_banned_user, parse_logins,
+    ping_cooldown_left, register_ping, release_ping, parse_audience, AUDIENCE_HELP,
+    MAX_LOGINS_PER_REQUEST, TOO_MANY_LOGINS
+)
+from utils.links import link_catalog
+from utils.profiler import profiler
+from utils.outbound import BROADCAST, NOTIFICATION, send_priority
+from utils.delivery import (
+    deliver, filter_active, inactive_users_count, is_user_inactive, reactivate_user
 )
 
 dp = Dispatcher()
@@ -63,13 +76,65 @@ async def cmd_unban(message: Message):
     remove_banned_user(user_id)
     await message.answer(f"Пользователь {target} (ID: {user_id}) разбанен ☑️")
 
+@dp.message(Command("inactive"))
+async def cmd_inactive(message: Message):
+    if message.from_user.id != int(dp["main_admin_id"]):
+        return await message.answer("У вас нет прав ⛔")
+
+    await message.answer(f"Недоступных получателей: {inactive_users_count()} 📵\n"
+                         f"Они пропускаются рассылками и уведомлениями до следующего /start")
+
+@dp.message(Command("sampler"))
+async def cmd_sampler(message: Message, command: CommandObject):
+    if message.from_user.id != int(dp["main_admin_id"]):
+        return await message.answer("У вас нет прав ⛔")
+
+    action = (command.args or "").strip().lower()
+    if action == "on":
+        if not profiler.start():
+            return await message.answer("Профайлер уже запущен")
+        await message.answer("Профайлер запущен ▶️\nОстановить и получить отчёт: /sampler off")
+    elif action == "off":
+        profiler.stop()
+        await message.answer(f"Профайлер остановлен ⏹\n\n{profiler.report()}")
+    elif action == "dump":
+        await message.answer(profiler.report())
+    else:
+        await message.answer("Использование: /sampler on | off | dump")
+
+@dp.message(Command("quota"))
+async def cmd_quota(message: Message):
+    if message.from_user.id != int(dp["main_admin_id"]):
+        return await message.answer("У вас нет прав ⛔")
+
+    status = dp["google_sheets_service"].sheets_scheduler.status()
+    lines = ["Квота Google Sheets 📊"]
+    for kind, title in (("read", "Чтение"), ("write", "Запись")):
+        info = status[kind]
+        lines.append(f"{title}: осталось {info['remaining']} из {info['per_minute']:.0f}/мин, "
+                     f"в очереди {info['waiting']}, ответов 429: {info['throttled']}")
+    await message.answer("\n".join(lines))
+
 @dp.message(Command("broadcast"))
-async def cmd_broadcast(message: Message, state: FSMContext):
+async def cmd_broadcast(message: Message, state: FSMContext, command: CommandObject):
     if message.from_user.id != int(dp["main_admin_id"]):
         return await message.answer("У вас нет прав ⛔")
-    
+
+    try:
+        filters = parse_audience(command.args)
+    except ValueError:
+        return await message.answer(AUDIENCE_HELP)
+
+    # Храним всю аудиторию: недоступных отсеиваем и считаем при отправке
+    audience = list(await dp["google_sheets_service"].resolve_audience(filters))
+    recipients = filter_active(audience)
+    if not recipients:
+        return await message.answer("Под выбранные фильтры не попал ни один доступный пользователь 🔍")
+
+    await state.update_data(audience=audience)
     await state.set_state(Form.waiting_for_broadcast)
-    await message.answer("Введите сообщение для рассылки:")
+    await message.answer(f"Получателей: {len(recipients)} (недоступных: {len(audience) - len(recipients)})\n"
+                         f"Введите сообщение для рассылки:")
 
 @dp.message(Form.waiting_for_broadcast)
 async def process_broadcast(message: Message, state: FSMContext):
@@ -78,25 +143,31 @@ async def process_broadcast(message: Message, state: FSMContext):
 
     await state.update_data(broadcast_message=message)
     await state.set_state(Form.waiting_for_broadcast_confirm)
+    recipients = filter_active((await state.get_data()).get("audience", []))
     await send_media_preview(message, message.chat.id)
-    await message.answer("Отправить рассылку?", reply_markup=broadcast_decision_keyboard())
+    await message.answer(f"Отправить рассылку? Получателей: {len(recipients)}",
+                         reply_markup=broadcast_decision_keyboard())
 
 @dp.callback_query(F.data == "broadcast_confirm", Form.waiting_for_broadcast_confirm)
 async def confirm_broadcast(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     broadcast_message = data.get("broadcast_message")
-    users = await dp["google_sheets_service"].get_users()
+    audience = data.get("audience", [])
+    active_users = filter_active(audience)
     
     success, failed = 0, 0
-    for user_id in users:
-        try:
-            await dp.bot.copy_message(user_id, broadcast_message.chat.id, broadcast_message.message_id)
-            success += 1
-        except:
-            failed += 1
+    with send_priority(BROADCAST):
+        for user_id in active_users:
+            if await deliver(dp.bot.copy_message, user_id, broadcast_message.chat.id, broadcast_message.message_id):
+                success += 1
+            else:
+                failed += 1
 
     await callback.message.delete()
-    await callback.message.answer(f"Рассылка завершена ☑️\nУспешно: {success}\nНе удалось: {failed}")
+    await callback.message.answer(
+        f"Рассылка завершена ☑️\nУспешно: {success}\nНе удалось: {failed}\n"
+        f"Пропущено недоступных: {len(audience) - len(active_users)}"
+    )
     await state.clear()
 
 @dp.callback_query(F.data == "broadcast_cancel", Form.waiting_for_broadcast_confirm)
@@ -111,6 +182,8 @@ async def cmd_start(message: Message):
     if is_user_banned(message.from_user.id):
         return await message.answer("Вы забанены и не можете использовать бота 🚫")
 
+    reactivate_user(message.from_user.id)
+
     user_data = await dp["google_sheets_service"].is_user_in_db(message.from_user.id)
     
     welcome_text = """<b>Привет! 👋🏻</b>
@@ -154,17 +227,93 @@ async def process_wanted(message: Message, state: FSMContext):
     if not re.fullmatch(r'^[a-z]{8}$', login):
         return await message.answer("Неверный формат логина! Используйте 8 маленьких латинских букв ❌")
     
-    all_records = dp["google_sheets_service"].sheet.get_all_records()
-    if not any(record.get('login') == login for record in all_records):
-        return await message.answer("Пир с таким логином не найден в базе")
+    service = dp["google_sheets_service"]
+    index = await service.get_user_index()
+    if login not in index["by_login"]:
+        # Отслеживать можно и пира, который не пользуется ботом, если он есть на платформе
+        profile = await service.get_participant(login)
+        if not profile or not profile["exists"]:
+            return await message.answer("Пир с таким логином не найден")
     
-    if await dp["google_sheets_service"].update_user_wanted(message.from_user.id, login):
+    if await service.update_user_wanted(message.from_user.id, login):
         await message.answer(f"Теперь вы отслеживаете пира: <b>{login}</b>", parse_mode="HTML")
     else:
         await message.answer("Ошибка при обновлении данных ❌")
     
     await state.clear()
 
+@dp.message(Command("digest"))
+async def cmd_digest(message: Message, command: CommandObject):
+    if await check_ban(message.from_user.id, message=message):
+        return
+
+    service = dp["google_sheets_service"]
+    user_data = await service.get_user_record(message.from_user.id)
+    if not user_data:
+        return await message.answer("Сначала зарегистрируйтесь с помощью /start")
+
+    args = (command.args or "").strip().lower()
+    if not args:
+        if not user_data.get('digest'):
+            return await message.answer(
+                "Ежедневный дайджест: когда ваши пиры пришли и ушли из кампуса и сколько там пробыли 📋\n\n"
+                "/digest on — подписаться (отслеживаемый пир из /wanted)\n"
+                "/digest <логин> <логин> ... — подписаться и добавить пиров\n"
+                "/digest off — отписаться"
+            )
+        logins = [login for login in str(user_data['digest']).split() if login != 'on']
+        tracked = [user_data['wanted']] if user_data.get('wanted') else []
+        tracked += [login for login in logins if login not in tracked]
+        return await message.answer(
+            f"Вы подписаны на дайджест 📋\nПиры: {', '.join(tracked) or 'нет — укажите /wanted или логины'}\n\n/digest off — отписаться"
+        )
+
+    if args == "off":
+        digest = ""
+    elif args == "on":
+        digest = "on"
+    else:
+        logins = parse_logins(args)
+        if len(logins) > MAX_LOGINS_PER_REQUEST:
+            return await message.answer(TOO_MANY_LOGINS)
+        invalid = [login for login in logins if not re.fullmatch(r'^[a-z]{8}$', login)]
+        if invalid:
+            return await message.answer(f"Неверный формат логина: {', '.join(invalid)} ❌")
+        digest = " ".join(logins)
+
+    if not await service.update_user_digest(message.from_user.id, digest):
+        return await message.answer("Ошибка при обновлении данных ❌")
+    if digest:
+        await message.answer("Вы подписались на ежедневный дайджест ☑️")
+    else:
+        await message.answer("Вы отписались от дайджеста ✖️")
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    if await check_ban(message.from_user.id, message=message):
+        return
+
+    login = (command.args or "").strip().lower()
+    if not re.fullmatch(r'^[a-z]{8}$', login):
+        return await message.answer("Укажите логин: /profile <логин>")
+
+    profile = await dp["google_sheets_service"].get_participant(login, with_coalition=True)
+    if profile is None:
+        return await message.answer("Платформа сейчас недоступна, попробуйте позже 🔄")
+    if not profile["exists"]:
+        return await message.answer(f"Пир {login} не найден на платформе ❓")
+
+    lines = [f"👤 <b>{escape(profile['login'])}</b>"]
+    if profile["campus"]:
+        lines.append(f"Кампус: {escape(profile['campus'])}")
+    if profile["level"] is not None:
+        lines.append(f"Уровень: {profile['level']}")
+    if profile["class_name"]:
+        lines.append(f"Поток: {escape(profile['class_name'])}")
+    if profile["coalition"]:
+        lines.append(f"Коалиция: {escape(profile['coalition'])}")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
 # Links section
 @dp.message(Command("links"))
 async def cmd_links_message(message: Message):
@@ -179,92 +328,61 @@ async def cmd_links(callback: CallbackQuery):
     await callback.message.answer('Полезные ссылки:', reply_markup=links_keyboard())
     await callback.answer()
 
-# Удаляем цикл и возвращаем явные обработчики для каждой ссылки:
-
-@dp.callback_query(F.data == "faq")
-async def cmd_faq(callback: CallbackQuery):
-    await callback.message.answer('FAQ Школы 21\nhttps://applicant.21-school.ru/faq')
-    await callback.answer()
-
-@dp.callback_query(F.data == "rules")
-async def cmd_rules(callback: CallbackQuery):
-    await callback.message.answer('Правила Школы 21\nhttps://applicant.21-school.ru/rules_yak')
-    await callback.answer()
-
-@dp.callback_query(F.data == "rocketchat")
-async def cmd_rocketchat(callback: CallbackQuery):
-    await callback.message.answer('Правила Рокетчата\nhttps://applicant.21-school.ru/rocketchat')
-    await callback.answer()
-
-@dp.callback_query(F.data == "internship_guide")
-async def cmd_internship_guide(callback: CallbackQuery):
-    await callback.message.answer('Гайд по стажировке\nhttps://applicant.21-school.ru/internship_guide')
-    await callback.answer()
-
-@dp.callback_query(F.data == "specialties")
-async def cmd_specialties(callback: CallbackQuery):
-    await callback.message.answer('Список специальностей для стажировки\nhttps://applicant.21-school.ru/specialties')
-    await callback.answer()
-
-@dp.callback_query(F.data == "gigacode")
-async def cmd_gigacode(callback: CallbackQuery):
-    await callback.message.answer('Общая позиция «Школы 21» в ИИ\nhttps://applicant.21-school.ru/gigacode')
-    await callback.answer()
-
-@dp.callback_query(F.data == "p2p")
-async def cmd_p2p(callback: CallbackQuery):
-    await callback.message.answer('Правила онлайн проверок\nhttps://applicant.21-school.ru/onlineeducation')
-    await callback.answer()
-
-@dp.callback_query(F.data == "final")
-async def cmd_final(callback: CallbackQuery):
-    await callback.message.answer('Что нужно для выпуска\nhttps://applicant.21-school.ru/final')
-    await callback.answer()
-
-@dp.callback_query(F.data == "email")
-async def cmd_email(callback: CallbackQuery):
-    await callback.message.answer('Почта Школы 21 YKS\nyks@21-school.ru\nПорядок отправки обращения\nhttps://applicant.21-school.ru/sla')
-    await callback.answer()
+@dp.message(Command("reload_links"))
+async def cmd_reload_links(message: Message):
+    if message.from_user.id != int(dp["main_admin_id"]):
+        return await message.answer("У вас нет прав ⛔")
 
-@dp.callback_query(F.data == "coins")
-async def cmd_coins(callback: CallbackQuery):
-    await callback.message.answer('Как зарабатывать коины\nhttps://applicant.21-school.ru/manual_points')
-    await callback.answer()
+    try:
+        count = link_catalog.load()
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return await message.answer(f"Не удалось перечитать {link_catalog.path}: {e} ❌")
+    await message.answer(f"Ссылки обновлены ☑️\nВсего: {count}")
 
-@dp.callback_query(F.data == "guests")
-async def cmd_guests(callback: CallbackQuery):
-    await callback.message.answer('Форма гостя\nhttps://forms.yandex.ru/u/65320571068ff019572c037e/\nПорядок проведения гостей в кампус\nhttps://applicant.21-school.ru/guests')
+# Один обработчик на все ссылки каталога: поиск ответа по словарю
+@dp.callback_query(F.data.func(link_catalog.__contains__))
+async def cmd_link(callback: CallbackQuery):
+    await callback.message.answer(link_catalog.reply(callback.data))
     await callback.answer()
 
 # Campus
-async def handle_campus_command(message: Message):
+async def handle_campus_command(message: Message, campus_arg: str = None):
     if await check_ban(message.from_user.id, message=message):
         return
     
     service = dp["google_sheets_service"]
+
+    campus_id = None
+    if campus_arg:
+        campus_names = await service.get_campus_names()
+        campus_arg = campus_arg.strip().lower()
+        for known_id in service.campus_ids:
+            if campus_arg in (known_id.lower(), campus_names.get(known_id, "").lower()):
+                campus_id = known_id
+                break
+        else:
+            available = ", ".join(campus_names.get(known_id, known_id) for known_id in service.campus_ids)
+            return await message.answer(f"Кампус не найден ❓\nДоступные кампусы: {available}")
     
     # Получаем кэшированные данные кампуса
-    campus_data = await service.get_campus_data(force_refresh=False)
+    campus_data = await service.get_campus_data(force_refresh=False, campus_id=campus_id)
     
-    if not campus_data or "cluster_map" not in campus_data:
+    if not campus_data or not campus_data.get("clusters"):
         await message.answer("🔄 Получаю данные о кампусе...")
-        campus_data = await service.get_campus_data(force_refresh=True)
+        campus_data = await service.get_campus_data(force_refresh=True, campus_id=campus_id)
     
-    if not campus_data or "cluster_map" not in campus_data:
+    if not campus_data or not campus_data.get("clusters"):
         await message.answer("❌ Не удалось получить данные о кампусе. Попробуйте позже.")
         return
     
-    cluster_id_to_name = {
-        "36621": "ay",
-        "36622": "er",
-        "36623": "tu",
-        "36624": "si"
-    }
+    clusters = campus_data.get("clusters", {})
+    cluster_id_to_name = {cluster_id: cluster["name"] for cluster_id, cluster in clusters.items()}
     
-    floors = [
-        {"clusters": ["36621", "36622"], "name": "2-й этаж"},
-        {"clusters": ["36623", "36624"], "name": "3-й этаж"}
-    ]
+    # Этажи строим по данным кластеров из API
+    floors = {}
+    for cluster_id, cluster in clusters.items():
+        floors.setdefault(cluster.get("floor") or 0, []).append(cluster_id)
+    floors = [{"clusters": floors[floor]} for floor in sorted(floors)]
     
     floor_groups = []
     cluster_map = campus_data["cluster_map"]
@@ -275,19 +393,33 @@ async def handle_campus_command(message: Message):
         floor_results = []
         for cluster_id in floor["clusters"]:
             if cluster_id in cluster_map:
-                cluster_name = cluster_id_to_name.get(cluster_id, cluster_id)
+                cluster_name = escape(str(cluster_id_to_name.get(cluster_id, cluster_id)))
                 for participant in cluster_map[cluster_id]:
                     login = participant.get("login", "")
                     row = participant.get("row", "")
                     number = participant.get("number", "")
                     if login:
-                        floor_results.append(f"👤  <b>{login}</b>   {cluster_name}-{row}{number}")
+                        floor_results.append(f"👤  <b>{escape(login)}</b>   {cluster_name}-{escape(str(row))}{escape(str(number))}")
                         total_peers += 1
         
         if floor_results:
             floor_results.sort(key=lambda x: x.split()[1].lower())
             floor_groups.append(floor_results)
     
+    # Кластеры, которые не удалось обновить, показываем с пометкой
+    stale_parts = []
+    for cluster_id, timestamp in campus_data.get("stale", {}).items():
+        cluster_name = escape(str(cluster_id_to_name.get(cluster_id, cluster_id)))
+        if timestamp:
+            stale_parts.append(f"{cluster_name} (данные на {timestamp:%H:%M})")
+        else:
+            stale_parts.append(f"{cluster_name} (нет данных)")
+    stale_note = f"⚠️ Не удалось обновить кластеры: {', '.join(stale_parts)}" if stale_parts else ""
+
+    if not cluster_map and stale_parts:
+        await message.answer("❌ Не удалось получить данные о кампусе. Попробуйте позже.")
+        return
+
     # Формируем ответ
     results = []
     for i, group in enumerate(floor_groups):
@@ -297,10 +429,16 @@ async def handle_campus_command(message: Message):
     
     if results:
         # Добавляем заголовок
-        header = f"👥 <b>Людей в кампусе: {total_peers}</b>\n\n"
+        campus_name = (await service.get_campus_names()).get(campus_data.get("campus_id"))
+        if campus_name:
+            header = f"👥 <b>Людей в кампусе {escape(campus_name)}: {total_peers}</b>\n\n"
+        else:
+            header = f"👥 <b>Людей в кампусе: {total_peers}</b>\n\n"
         
         # Объединяем все результаты в одно сообщение
         full_message = header + "\n".join(results)
+        if stale_note:
+            full_message += f"\n\n{stale_note}"
         
         # Проверяем, не превышает ли сообщение лимит Telegram (4096 символов)
         if len(full_message) <= 4096:
@@ -309,6 +447,8 @@ async def handle_campus_command(message: Message):
             # Если превышает - разбиваем на части
             await message.answer("Слишком много людей в кампусе для отображения в одном сообщении!")
             
+    elif stale_note:
+        await message.answer(f"😴 В обновлённых кластерах никого нет\n\n{stale_note}")
     else:
         await message.answer("😴 В кампусе никого нет")
 
@@ -318,44 +458,57 @@ async def cmd_campus_callback(callback: CallbackQuery):
     await callback.answer()
 
 @dp.message(Command("campus"))
-async def cmd_campus_message(message: Message):
-    await handle_campus_command(message)
+async def cmd_campus_message(message: Message, command: CommandObject):
+    await handle_campus_command(message, command.args)
 
 # Search
 @dp.message(Command("search"))
-async def cmd_search_message(message: Message, state: FSMContext):
+async def cmd_search_message(message: Message, state: FSMContext, command: CommandObject):
     if await check_ban(message.from_user.id, message=message):
         return
-    await message.answer('Введите школьный логин пользователя:')
+    if command.args:
+        return await process_search_common(message, state, command.args)
+    await message.answer('Введите школьный логин пользователя (можно несколько через пробел):')
     await state.set_state(Form.search)
 
 @dp.callback_query(F.data == "search")
 async def cmd_search(callback: CallbackQuery, state: FSMContext):
     if await check_ban(callback.from_user.id, callback=callback):
         return
-    await callback.message.answer('Введите школьный логин пользователя:')
+    await callback.message.answer('Введите школьный логин пользователя (можно несколько через пробел):')
     await state.set_state(Form.search)
     await callback.answer()
 
-async def process_search_common(message: Message, state: FSMContext):
-    login = message.text.strip()
-    user_data = await dp["google_sheets_service"].find_user_by_login(login)
-    
-    if user_data:
-        user_id, name, telegram_username = user_data
-        name = escape(name)
-        
-        if telegram_username:
-            text = f"Пользователь найден ✅\n\n<b>{name} <a href='tg://user?id={user_id}'>@{escape(telegram_username)}</a></b>"
-        else:
-            text = f"Пользователь найден ✅\n\n<b>{name} ID: {user_id}</b>"
-        
-        await message.answer(text, parse_mode="HTML", reply_markup=menu_keyboard())
-    else:
-        await message.answer("Пользователь с таким логином не найден ❓", reply_markup=cancel_keyboard())
-    
+def format_found_user(user_data):
+    user_id, name, telegram_username = user_data
+    name = escape(name)
+    if telegram_username:
+        return f"<b>{name} <a href='tg://user?id={user_id}'>@{escape(telegram_username)}</a></b>"
+    return f"<b>{name} ID: {user_id}</b>"
+
+async def process_search_common(message: Message, state: FSMContext, text: str = None):
+    logins = parse_logins(text or message.text or '')
+    if len(logins) > MAX_LOGINS_PER_REQUEST:
+        return await message.answer(TOO_MANY_LOGINS, reply_markup=cancel_keyboard())
+    found = await dp["google_sheets_service"].find_users_by_logins(logins)
     await state.clear()
 
+    if not found:
+        return await message.answer("Пользователь с таким логином не найден ❓", reply_markup=cancel_keyboard())
+
+    if len(logins) == 1:
+        text = f"Пользователь найден ✅\n\n{format_found_user(found[logins[0]])}"
+    else:
+        lines = []
+        for login in logins:
+            if login in found:
+                lines.append(f"✅ {escape(login)}: {format_found_user(found[login])}")
+            else:
+                lines.append(f"❓ {escape(login)}: не найден")
+        text = "Результаты поиска:\n\n" + "\n".join(lines)
+
+    await message.answer(text, parse_mode="HTML", reply_markup=menu_keyboard())
+
 @dp.message(Form.search)
 async def process_search(message: Message, state: FSMContext):
     await process_search_common(message, state)
@@ -402,43 +555,135 @@ async def cmd_ref_message(message: Message):
 
 # Ping
 @dp.message(Command("ping"))
-async def cmd_ping_message(message: Message, state: FSMContext):
+async def cmd_ping_message(message: Message, state: FSMContext, command: CommandObject):
     if await check_ban(message.from_user.id, message=message):
         return
-    await message.answer('Введите школьный логин пользователя:')
+    if command.args:
+        return await process_ping_common(message, state, command.args)
+    await message.answer('Введите школьный логин пользователя (можно несколько через пробел):')
     await state.set_state(Form.ping)
 
 @dp.callback_query(F.data == "ping")
 async def cmd_ping(callback: CallbackQuery, state: FSMContext):
     if await check_ban(callback.from_user.id, callback=callback):
         return
-    await callback.message.answer('Введите школьный логин пользователя:')
+    await callback.message.answer('Введите школьный логин пользователя (можно несколько через пробел):')
     await state.set_state(Form.ping)
     await callback.answer()
 
-async def process_ping_common(message: Message, state: FSMContext):
-    login = message.text.strip()
-    user_data = await dp["google_sheets_service"].find_user_by_login(login)
-    
-    if user_data:
-        sender_data = await dp["google_sheets_service"].is_user_in_db(message.from_user.id)
-        if sender_data:
-            await message.bot.send_message(
-                user_data[0],
-                f"Напоминание от <b>{sender_data[0]}:</b> 📢\n\n<b>У нас проверка! 🔔</b>",
-                parse_mode="HTML"
-            )
-            await message.answer(f"Сообщение отправлено пользователю {user_data[1]} ✉️", 
-                               reply_markup=menu_keyboard())
-    else:
-        await message.answer("Пользователь с таким логином не найден ❓", reply_markup=cancel_keyboard())
-    
+async def send_ping(bot: Bot, sender_id: int, sender_login: str, recipient_id: int):
+    with send_priority(NOTIFICATION):
+        delivered = await deliver(
+            bot.send_message,
+            recipient_id,
+            f"Напоминание от <b>{sender_login}:</b> 📢\n\n<b>У нас проверка! 🔔</b>",
+            parse_mode="HTML"
+        )
+    if not delivered:
+        # Слот занят заранее; если доставить не удалось, освобождаем его
+        release_ping(sender_id, recipient_id)
+    return delivered
+
+async def process_ping_common(message: Message, state: FSMContext, text: str = None):
+    logins = parse_logins(text or message.text or '')
+    if len(logins) > MAX_LOGINS_PER_REQUEST:
+        return await message.answer(TOO_MANY_LOGINS, reply_markup=cancel_keyboard())
+    service = dp["google_sheets_service"]
     await state.clear()
 
+    sender_data = await service.is_user_in_db(message.from_user.id)
+    if not sender_data:
+        return await message.answer("Для напоминаний необходимо пройти регистрацию 🚀",
+                                    reply_markup=registration_keyboard())
+
+    found = await service.find_users_by_logins(logins)
+    if not found:
+        return await message.answer("Пользователь с таким логином не найден ❓", reply_markup=cancel_keyboard())
+
+    sender_id = message.from_user.id
+    statuses = {}
+    to_send = []
+    for login in logins:
+        if login not in found:
+            statuses[login] = "❓ не найден"
+            continue
+        recipient_id = found[login][0]
+        cooldown = ping_cooldown_left(sender_id, recipient_id)
+        if is_user_inactive(recipient_id):
+            statuses[login] = "🚫 пир недоступен (бот заблокирован)"
+        elif cooldown:
+            statuses[login] = f"⏳ можно повторить через {cooldown // 60 + 1} мин"
+        else:
+            # Занимаем слот до первого await, чтобы параллельные /ping не прошли проверку
+            register_ping(sender_id, recipient_id)
+            to_send.append(login)
+
+    results = await asyncio.gather(*(
+        send_ping(message.bot, sender_id, sender_data[0], found[login][0]) for login in to_send
+    ))
+    for login, delivered in zip(to_send, results):
+        statuses[login] = "✉️ отправлено" if delivered else "❌ не удалось доставить"
+
+    if len(logins) == 1 and to_send and results[0]:
+        text = f"Сообщение отправлено пользователю {escape(found[logins[0]][1])} ✉️"
+    else:
+        text = "Напоминания:\n\n" + "\n".join(f"<b>{escape(login)}</b>: {statuses[login]}" for login in logins)
+    await message.answer(text, parse_mode="HTML", reply_markup=menu_keyboard())
+
 @dp.message(Form.ping)
 async def process_ping(message: Message, state: FSMContext):
     await process_ping_common(message, state)
 
+# Inline
+INLINE_RESULTS_LIMIT = 20
+
+def inline_peer_result(login, profile, seat):
+    lines = [f"👤 <b>{escape(login)}</b>"]
+    title = login
+    if profile:
+        user_id, name, telegram_username = profile
+        title = f"{login} — {name}" if name else login
+        lines.append(format_found_user(profile))
+    lines.append(f"📍 В кампусе: {escape(seat)}" if seat else "Сейчас не в кампусе")
+    return InlineQueryResultArticle(
+        id=login,
+        title=title,
+        description=f"📍 {seat}" if seat else "Не в кампусе",
+        input_message_content=InputTextMessageContent(message_text="\n".join(lines), parse_mode="HTML")
+    )
+
+@dp.inline_query()
+async def inline_search(inline_query: InlineQuery):
+    if is_user_banned(inline_query.from_user.id):
+        return await inline_query.answer([], cache_time=300, is_personal=True)
+
+    # Отвечаем только из памяти: на каждое нажатие клавиши не ходим ни в таблицу, ни в API
+    service = dp["google_sheets_service"]
+    index = service.peek_user_index()
+    seats = service.peek_campus_seats()
+    profiles = index["profiles"] if index else {}
+    prefix = inline_query.query.strip().lower()
+
+    if prefix:
+        matches = set()
+        logins = index["sorted_logins"] if index else []
+        i = bisect_left(logins, prefix)
+        while i < len(logins) and logins[i].startswith(prefix) and len(matches) < INLINE_RESULTS_LIMIT:
+            matches.add(logins[i])
+            i += 1
+        matches.update(login for login in seats if login.startswith(prefix))
+    else:
+        matches = set(seats)
+
+    results = [
+        inline_peer_result(login, profiles.get(login), seats.get(login))
+        for login in sorted(matches)[:INLINE_RESULTS_LIMIT]
+    ]
+    if index is None:
+        # Индекс ещё строится: неполный ответ не должен закэшироваться у Telegram
+        return await inline_query.answer(results, cache_time=0, is_personal=True)
+    await inline_query.answer(results, cache_time=30, is_personal=False)
+
 # Registration
 @dp.callback_query(F.data == "register")
 async def start_registration(callback: CallbackQuery, state: FSMContext):
@@ -469,6 +714,10 @@ async def re_register(callback: CallbackQuery, state: FSMContext):
 async def process_login(message: Message, state: FSMContext):
     login = message.text.strip()
     if re.fullmatch(r'^[a-z]{8}$', login):
+        profile = await dp["google_sheets_service"].get_participant(login)
+        if profile and not profile["exists"]:
+            return await message.answer("Такого логина нет на платформе Школы 21 🚫\nПроверьте написание",
+                                        reply_markup=cancel_keyboard())
         await state.update_data(login=login)
         await message.answer("Теперь введите ваше имя:")
         await state.set_state(Form.name)
@@ -1,9 +1,12 @@
 import asyncio
+import logging
 from aiogram import Bot, Dispatcher
 from handlers.handlers import dp
 from services.google_sheets_service import GoogleSheetsService
-from utils.helpers import set_main_menu
-from config import TOKEN, MAIN_ADMIN_ID, login_token, password_token, GOOGLE_SHEETS_CREDS, SPREADSHEET_KEY
+from services.sheets_scheduler import SheetsScheduler
+from utils.helpers import set_main_menu, setup_middlewares
+from config import TOKEN, MAIN_ADMIN_ID, login_token, password_token, GOOGLE_SHEETS_CREDS, SPREADSHEET_KEY, SLOW_UPDATE_MS, CAMPUS_IDS
+from config import SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, DIGEST_TIME
 
 bot = Bot(token=TOKEN)
 
@@ -13,7 +16,9 @@ async def main():
         GOOGLE_SHEETS_CREDS, 
         SPREADSHEET_KEY,
         login_token,
-        password_token
+        password_token,
+        campus_ids=CAMPUS_IDS,
+        sheets_scheduler=SheetsScheduler(SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE)
     )
     await service.initialize()
 
@@ -22,9 +27,13 @@ async def main():
     dp["main_admin_id"] = int(MAIN_ADMIN_ID) if MAIN_ADMIN_ID else None
     dp.bot = bot
 
+    # Трассировка и лимиты Telegram — те же, что и в нагрузочном тесте
+    setup_middlewares(dp, bot, SLOW_UPDATE_MS)
+
     # Запускаем периодические задачи
     asyncio.create_task(service.check_campus_periodically(bot))
     asyncio.create_task(service.reset_notified_daily())
+    asyncio.create_task(service.send_digest_daily(bot, DIGEST_TIME))
 
     # Регистрируем обработчик запуска
     dp.startup.register(set_main_menu)
@@ -33,4 +42,5 @@ async def main():
     await dp.start_polling(bot)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
\ No newline at end of file
@@ -2,15 +2,42 @@ import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import asyncio
 import aiohttp
+import random
+from html import escape
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from utils.delivery import deliver, is_user_inactive
+from utils.tracing import traced
+from utils.outbound import BROADCAST, NOTIFICATION, send_priority
+from services.sheets_scheduler import BACKGROUND, SheetsScheduler, sheets_priority
+from services.presence_history import PresenceHistory
+from gspread.utils import rowcol_to_a1
+
+API_URL = "https://platform.21-school.ru/services/21-school/api/v1"
+
+# Кампус по умолчанию, если CAMPUS_IDS не задан: кластеры Якутска без обращения к API
+DEFAULT_CAMPUS = "default"
+DEFAULT_CLUSTERS = {
+    "36621": {"name": "ay", "floor": 2},
+    "36622": {"name": "er", "floor": 2},
+    "36623": {"name": "tu", "floor": 3},
+    "36624": {"name": "si", "floor": 3}
+}
+
+def _clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
 
 class GoogleSheetsService:
-    def __init__(self, creds_file, spreadsheet_key, login_token, password_token):
+    def __init__(self, creds_file, spreadsheet_key, login_token, password_token, sheet=None, campus_ids=None,
+                 sheets_scheduler=None):
         self.scope = ['https://spreadsheets.google.com/feeds',
                      'https://www.googleapis.com/auth/drive']
-        self.creds = ServiceAccountCredentials.from_json_keyfile_name(creds_file, self.scope)
-        self.client = gspread.authorize(self.creds)
-        self.sheet = self.client.open_by_key(spreadsheet_key).sheet1
+        if sheet is None:
+            self.creds = ServiceAccountCredentials.from_json_keyfile_name(creds_file, self.scope)
+            self.client = gspread.authorize(self.creds)
+            sheet = self.client.open_by_key(spreadsheet_key).sheet1
+        self.sheet = sheet
+        self.sheets_scheduler = sheets_scheduler or SheetsScheduler()
         
         self.login_token = login_token
         self.password_token = password_token
@@ -18,14 +45,53 @@ class GoogleSheetsService:
         # Cache
         self._access_token = None
         self._token_expiry = None
-        self._campus_data_cache = None
-        self._cache_timestamp = None
-        self._cache_lock = asyncio.Lock()
+        self._campus_data_cache = {}
+        self._cache_timestamp = {}
+        self._cache_locks = {}
         
         # Cache timing
         self._min_cache_seconds = 30
         self._max_cache_seconds = 300
+
+        # Campuses and clusters
+        self.campus_ids = list(campus_ids) if campus_ids else [DEFAULT_CAMPUS]
+        self._campus_clusters = {}
+        self._campus_names = {}
+        self._campus_names_timestamp = None
+        self._campus_names_seconds = 0
+        self._campus_names_lock = asyncio.Lock()
+        self._discovery_seconds = 6 * 3600
+        self._discovery_retry_seconds = 5 * 60
+        self._fetch_semaphore = asyncio.Semaphore(8)
+        self._cluster_state = {}
+        self._fetch_timeout_seconds = 5
+        self._fetch_attempts = 3
+        self._refresh_deadline_seconds = 10
+        self._retry_base_seconds = 0.5
+        self._breaker_threshold = 3
+        self._breaker_reset_seconds = 120
+
+        # User index
+        self._user_index = None
+        self._user_index_timestamp = None
+        self._user_index_invalidated = datetime.min
+        self._user_index_seconds = 60
+        self._user_index_lock = asyncio.Lock()
+        self._background_refreshes = {}
+
+        # Presence history for daily digests
+        self.presence = PresenceHistory()
+
+        # Participants: login -> (expires_at, profile), LRU
+        self._participant_cache = OrderedDict()
+        self._participant_inflight = {}
+        self._participant_cache_size = 1000
+        self._participant_ttl_seconds = 3600
+        self._participant_negative_ttl_seconds = 600
+        self._participant_unavailable_seconds = 30
+        self._participant_unavailable_until = None
     
+    @traced("school.get_access_token")
     async def get_access_token(self) -> str:
         now = datetime.now()
         
@@ -52,114 +118,328 @@ class GoogleSheetsService:
         except:
             return None
     
-    async def get_campus_data(self, force_refresh=False) -> dict:
+    async def get_campus_data(self, force_refresh=False, campus_id=None) -> dict:
+        campus_id = campus_id or self.campus_ids[0]
         now = datetime.now()
         
-        async with self._cache_lock:
-            if (not force_refresh and self._campus_data_cache and self._cache_timestamp):
-                cache_age = (now - self._cache_timestamp).total_seconds()
+        async with self._cache_locks.setdefault(campus_id, asyncio.Lock()):
+            cached = self._campus_data_cache.get(campus_id)
+            timestamp = self._cache_timestamp.get(campus_id)
+            if (not force_refresh and cached and timestamp):
+                cache_age = (now - timestamp).total_seconds()
                 if cache_age < self._min_cache_seconds:
-                    return self._campus_data_cache
+                    return cached
                 if cache_age > self._max_cache_seconds:
                     force_refresh = True
             
-            if force_refresh or not self._campus_data_cache:
+            if force_refresh or not cached:
+                clusters = self._campus_clusters.get(campus_id, (None, {}))[1]
                 token = await self.get_access_token()
-                if not token:
-                    return self._campus_data_cache or {}
-                
-                clusters = ["36621", "36622", "36623", "36624"]
-                cluster_map = {}
-                
-                try:
+                if token:
                     headers = {'Authorization': f'Bearer {token}'}
-                    tasks = []
-                    for cluster_id in clusters:
-                        url = f"https://platform.21-school.ru/services/21-school/api/v1/clusters/{cluster_id}/map"
-                        tasks.append(self._fetch_cluster(url, headers, cluster_id))
-                    
-                    results = await asyncio.gather(*tasks)
-                    
-                    for i, result in enumerate(results):
-                        cluster_id = clusters[i]
-                        if not result:
-                            continue
-                            
-                        for participant in result.get("clusterMap", []):
-                            if login := participant.get("login"):
-                                if cluster_id not in cluster_map:
-                                    cluster_map[cluster_id] = []
-                                cluster_map[cluster_id].append({
-                                    "login": login,
-                                    "row": participant.get("row"),
-                                    "number": participant.get("number")
-                                })
-                    
-                    self._campus_data_cache = {"cluster_map": cluster_map}
-                    self._cache_timestamp = now
-                    
-                except:
-                    pass
+                    timeout = aiohttp.ClientTimeout(total=self._fetch_timeout_seconds)
+                    async with aiohttp.ClientSession(timeout=timeout) as session:
+                        clusters = await self._get_campus_clusters(session, headers, campus_id, now)
+                        await asyncio.gather(*(
+                            self._refresh_cluster(session, headers, cluster_id, now)
+                            for cluster_id in clusters
+                        ))
+                elif campus_id == DEFAULT_CAMPUS:
+                    clusters = DEFAULT_CLUSTERS
+
+                self._campus_data_cache[campus_id] = self._build_campus_snapshot(campus_id, clusters, now)
+                self._cache_timestamp[campus_id] = now
             
-            return self._campus_data_cache or {}
-    
-    async def _fetch_cluster(self, url, headers, cluster_id):
+            return self._campus_data_cache.get(campus_id) or {}
+
+    async def get_all_campus_data(self, force_refresh=False) -> dict:
+        snapshots = await asyncio.gather(*(
+            self.get_campus_data(force_refresh, campus_id) for campus_id in self.campus_ids
+        ))
+        return dict(zip(self.campus_ids, snapshots))
+
+    async def get_present_logins(self, force_refresh=False, fresh_only=False) -> set:
+        present = set()
+        for snapshot in (await self.get_all_campus_data(force_refresh)).values():
+            stale = snapshot.get("stale", {}) if fresh_only else {}
+            for cluster_id, participants in snapshot.get("cluster_map", {}).items():
+                if cluster_id not in stale:
+                    present.update(p["login"] for p in participants)
+        return present
+
+    async def _get_campus_clusters(self, session, headers, campus_id, now) -> dict:
+        if campus_id == DEFAULT_CAMPUS:
+            return DEFAULT_CLUSTERS
+
+        discovered_at, clusters = self._campus_clusters.get(campus_id, (None, {}))
+        if discovered_at and (now - discovered_at).total_seconds() < self._discovery_seconds:
+            return clusters
+
+        async with self._fetch_semaphore:
+            status, data = await self._api_get(session, f"{API_URL}/campuses/{campus_id}/clusters", headers)
+        if status == 200 and data:
+            clusters = {
+                str(cluster["id"]): {"name": cluster.get("name") or str(cluster["id"]), "floor": cluster.get("floor")}
+                for cluster in data.get("clusters", [])
+            }
+            self._campus_clusters[campus_id] = (now, clusters)
+        # При ошибке остаёмся на последнем известном списке кластеров
+        return clusters
+
+    def _campus_names_fresh(self) -> bool:
+        return bool(self._campus_names_timestamp
+                    and (datetime.now() - self._campus_names_timestamp).total_seconds() < self._campus_names_seconds)
+
+    async def get_campus_names(self) -> dict:
+        """Короткие названия настроенных кампусов (campus_id -> shortName)."""
+        if self.campus_ids == [DEFAULT_CAMPUS]:
+            return {}
+        if self._campus_names_fresh():
+            return self._campus_names
+
+        async with self._campus_names_lock:
+            if self._campus_names_fresh():
+                return self._campus_names
+
+            # При ошибке оставляем прежние названия и повторяем не раньше чем через _discovery_retry_seconds
+            self._campus_names_timestamp = datetime.now()
+            self._campus_names_seconds = self._discovery_retry_seconds
+            token = await self.get_access_token()
+            if not token:
+                return self._campus_names
+            headers = {'Authorization': f'Bearer {token}'}
+            timeout = aiohttp.ClientTimeout(total=self._fetch_timeout_seconds)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with self._fetch_semaphore:
+                    status, data = await self._api_get(session, f"{API_URL}/campuses", headers)
+            if status == 200 and data:
+                self._campus_names = {
+                    campus["id"]: campus.get("shortName") or campus["id"]
+                    for campus in data.get("campuses", [])
+                    if campus.get("id") in self.campus_ids
+                }
+                self._campus_names_seconds = self._discovery_seconds
+            return self._campus_names
+
+    def _build_campus_snapshot(self, campus_id, clusters, now) -> dict:
+        cluster_map = {}
+        stale = {}
+        seats = {}
+        for cluster_id in clusters:
+            state = self._cluster_state.get(cluster_id)
+            if state and state["participants"] is not None:
+                cluster_map[cluster_id] = state["participants"]
+                cluster_name = clusters[cluster_id]["name"]
+                for p in state["participants"]:
+                    seats[p["login"]] = f"{cluster_name}-{p['row']}{p['number']}"
+            if not state or state["timestamp"] != now:
+                # Кластер не обновился в этом цикле: показываем последние данные и время их получения
+                stale[cluster_id] = state["timestamp"] if state else None
+        return {"campus_id": campus_id, "clusters": clusters, "cluster_map": cluster_map, "stale": stale,
+                "seats": seats}
+
+    async def _refresh_cluster(self, session, headers, cluster_id, now):
+        state = self._cluster_state.setdefault(cluster_id, {
+            "participants": None,
+            "timestamp": None,
+            "failures": 0,
+            "open_until": None
+        })
+        if state["open_until"] and now < state["open_until"]:
+            return
+
         try:
-            async with aiohttp.ClientSession() as session:
+            async with self._fetch_semaphore:
+                # Общий дедлайн на все повторы: зависший кластер не держит весь снимок кампуса
+                result = await asyncio.wait_for(
+                    self._fetch_cluster(session, f"{API_URL}/clusters/{cluster_id}/map", headers),
+                    timeout=self._refresh_deadline_seconds
+                )
+        except asyncio.TimeoutError:
+            result = None
+        if result is None:
+            state["failures"] += 1
+            if state["failures"] >= self._breaker_threshold:
+                state["open_until"] = now + timedelta(seconds=self._breaker_reset_seconds)
+            return
+
+        state["participants"] = [
+            {
+                "login": participant["login"],
+                "row": participant.get("row"),
+                "number": participant.get("number")
+            }
+            for participant in result.get("clusterMap", [])
+            if participant.get("login")
+        ]
+        state["timestamp"] = now
+        state["failures"] = 0
+        state["open_until"] = None
+    
+    @traced("school.fetch_cluster")
+    async def _fetch_cluster(self, session, url, headers):
+        status, data = await self._api_get(session, url, headers)
+        return data if status == 200 else None
+
+    async def _api_get(self, session, url, headers):
+        """GET к School API с повторами на 429/5xx. Возвращает (status, json); status None — сеть недоступна."""
+        status = None
+        for attempt in range(self._fetch_attempts):
+            try:
                 async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-        except:
+                    status = response.status
+                    if status == 200:
+                        return status, await response.json()
+                    if status < 500 and status != 429:
+                        return status, None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                status = None
+            if attempt + 1 < self._fetch_attempts:
+                delay = self._retry_base_seconds * 2 ** attempt
+                await asyncio.sleep(delay + random.uniform(0, delay))
+        return status, None
+
+    async def get_participant(self, login: str, with_coalition=False):
+        """Профиль участника с платформы.
+
+        Возвращает dict с ключом exists (False — логина на платформе нет)
+        или None, если API сейчас недоступен. Ответы кэшируются, одновременные
+        запросы одного логина объединяются в один. Коалиция запрашивается
+        отдельно и только при with_coalition.
+        """
+        now = datetime.now()
+        cached = self._participant_cache.get(login)
+        if cached and now < cached[0]:
+            self._participant_cache.move_to_end(login)
+            profile = cached[1]
+        else:
+            # После отказа API не повторяем запросы до конца паузы
+            if self._participant_unavailable_until and now < self._participant_unavailable_until:
+                return None
+            task = self._participant_inflight.get(login)
+            if task is None:
+                task = asyncio.ensure_future(self._load_participant(login))
+                self._participant_inflight[login] = task
+                task.add_done_callback(lambda _: self._participant_inflight.pop(login, None))
+            profile = await asyncio.shield(task)
+
+        if with_coalition and profile and profile["exists"] and "coalition" not in profile:
+            coalition = await self._load_coalition(login)
+            if coalition is None:
+                return {**profile, "coalition": ""}
+            profile["coalition"] = coalition
+        return profile
+
+    def _school_api_failed(self):
+        self._participant_unavailable_until = datetime.now() + timedelta(seconds=self._participant_unavailable_seconds)
+
+    async def _school_get(self, url):
+        """GET к School API: свой слот семафора и общий дедлайн на все повторы."""
+        token = await self.get_access_token()
+        if not token:
+            return None, None
+        headers = {'Authorization': f'Bearer {token}'}
+        timeout = aiohttp.ClientTimeout(total=self._fetch_timeout_seconds)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with self._fetch_semaphore:
+                    return await asyncio.wait_for(self._api_get(session, url, headers),
+                                                  timeout=self._refresh_deadline_seconds)
+        except asyncio.TimeoutError:
+            return None, None
+
+    @traced("school.get_participant")
+    async def _load_participant(self, login):
+        status, data = await self._school_get(f"{API_URL}/participants/{login}")
+
+        if status == 200 and data:
+            profile = {
+                "exists": True,
+                "login": data.get("login", login),
+                "campus": (data.get("campus") or {}).get("shortName", ""),
+                "level": data.get("level"),
+                "class_name": data.get("className", ""),
+                "status": data.get("status", "")
+            }
+            ttl = self._participant_ttl_seconds
+        elif status in (400, 404):
+            profile = {"exists": False, "login": login}
+            ttl = self._participant_negative_ttl_seconds
+        else:
+            self._school_api_failed()
             return None
+
+        self._participant_cache[login] = (datetime.now() + timedelta(seconds=ttl), profile)
+        self._participant_cache.move_to_end(login)
+        while len(self._participant_cache) > self._participant_cache_size:
+            self._participant_cache.popitem(last=False)
+        return profile
+
+    @traced("school.get_coalition")
+    async def _load_coalition(self, login):
+        status, data = await self._school_get(f"{API_URL}/participants/{login}/coalition")
+        if status == 200:
+            return (data or {}).get("name", "")
+        if status in (400, 404):
+            return ""
+        self._school_api_failed()
+        return None
     
     async def check_campus_periodically(self, bot):
-        while True:
-            try:
-                campus_data = await self.get_campus_data(force_refresh=True)
-                present_logins = {p["login"] for cluster in campus_data.get("cluster_map", {}).values() 
-                                for p in cluster}
+        # Фоновая задача: её запросы к таблице уступают пользовательским
+        with sheets_priority(BACKGROUND):
+            while True:
+                try:
+                    present_logins = await self.get_present_logins(force_refresh=True, fresh_only=True)
+                    self.presence.record(present_logins)
                 
-                if present_logins:
-                    tracking_users = await self.get_all_tracking_users()
+                    if present_logins:
+                        tracking_users = await self.get_all_tracking_users()
                     
-                    for user_id, wanted_login in tracking_users:
-                        user_data = await self.get_user_record(user_id)
-                        if not user_data:
-                            continue
-                        
-                        notified = user_data.get('notified', 'FALSE') == 'TRUE'
+                        for user_id, wanted_login, notified in tracking_users:
+                            if is_user_inactive(user_id):
+                                continue
                         
-                        if wanted_login in present_logins and not notified:
-                            try:
-                                await bot.send_message(
-                                    user_id,
-                                    f"🚨 Ваш отслеживаемый пир {wanted_login} сейчас в кампусе!"
-                                )
-                                await self.update_user_notified(user_id, True)
-                            except:
-                                pass
+                            if wanted_login in present_logins and not notified:
+                                with send_priority(NOTIFICATION):
+                                    delivered = await deliver(
+                                        bot.send_message,
+                                        user_id,
+                                        f"🚨 Ваш отслеживаемый пир {wanted_login} сейчас в кампусе!"
+                                    )
+                                if delivered:
+                                    await self.update_user_notified(user_id, True)
                 
-                await asyncio.sleep(300)
+                    await asyncio.sleep(300)
                 
-            except:
-                await asyncio.sleep(60)
+                except:
+                    await asyncio.sleep(60)
 
+    async def _read(self, func, *args, **kwargs):
+        return await self.sheets_scheduler.run("read", func, *args, **kwargs)
+
+    async def _write(self, func, *args, **kwargs):
+        return await self.sheets_scheduler.run("write", func, *args, **kwargs)
+
+    @traced("sheets.is_user_in_db")
     async def is_user_in_db(self, user_id: int):
-        records = self.sheet.get_all_records()
+        records = await self._read(self.sheet.get_all_records)
         for record in records:
             if record['user_id'] == user_id:
                 return (record['login'], record['name'])
         return None
 
+    @traced("sheets.add_user_to_db")
     async def add_user_to_db(self, user_id: int, login: str, name: str, telegram_username: str):
-        records = self.sheet.get_all_records()
-        headers = self.sheet.row_values(1)
+        records = await self._read(self.sheet.get_all_records)
+        headers = await self._read(self.sheet.row_values, 1)
 
         for i, record in enumerate(records, start=2):
             if record['user_id'] == user_id:
-                self.sheet.update_cell(i, headers.index('login') + 1, login)
-                self.sheet.update_cell(i, headers.index('name') + 1, name)
-                self.sheet.update_cell(i, headers.index('telegram_username') + 1, telegram_username)
+                await self._write(self.sheet.update_cell, i, headers.index('login') + 1, login)
+                await self._write(self.sheet.update_cell, i, headers.index('name') + 1, name)
+                await self._write(self.sheet.update_cell, i, headers.index('telegram_username') + 1, telegram_username)
+                self._invalidate_user_index()
                 return
 
         new_row = ['' for _ in headers]
@@ -167,22 +447,144 @@ class GoogleSheetsService:
         new_row[headers.index('login')] = login
         new_row[headers.index('name')] = name
         new_row[headers.index('telegram_username')] = telegram_username
+        if 'registered_at' in headers:
+            new_row[headers.index('registered_at')] = datetime.now().strftime('%Y-%m-%d')
 
-        self.sheet.append_row(new_row)
+        await self._write(self.sheet.append_row, new_row)
+        self._invalidate_user_index()
 
+    @traced("sheets.find_user_by_login")
     async def find_user_by_login(self, login: str):
-        records = self.sheet.get_all_records()
+        records = await self._read(self.sheet.get_all_records)
         for record in records:
             if record['login'] == login:
                 return (record['user_id'], record['name'], record['telegram_username'])
         return None
 
-    async def get_users(self):
-        records = self.sheet.get_all_records()
-        return [record['user_id'] for record in records]
+    @traced("sheets.find_users_by_logins")
+    async def find_users_by_logins(self, logins):
+        wanted = set(logins)
+        found = {}
+        records = await self._read(self.sheet.get_all_records)
+        for record in records:
+            login = record['login']
+            if login in wanted and login not in found:
+                found[login] = (record['user_id'], record['name'], record['telegram_username'])
+        return found
+
+    def _invalidate_user_index(self):
+        # Индекс, прочитанный до этой записи, больше не считается свежим и не будет установлен
+        self._user_index_invalidated = datetime.now()
+
+    def _user_index_is_fresh(self) -> bool:
+        return bool(self._user_index and self._user_index_timestamp
+                    and self._user_index_timestamp > self._user_index_invalidated
+                    and (datetime.now() - self._user_index_timestamp).total_seconds() < self._user_index_seconds)
+
+    @traced("sheets.get_user_index")
+    async def get_user_index(self, force_refresh=False) -> dict:
+        if not force_refresh and self._user_index_is_fresh():
+            return self._user_index
+
+        # Блокировка только склеивает одновременные пользовательские запросы;
+        # фоновые обновления читают таблицу без неё и не задерживают пользователей
+        async with self._user_index_lock:
+            if not force_refresh and self._user_index_is_fresh():
+                return self._user_index
+            return await self._load_user_index()
+
+    async def _load_user_index(self) -> dict:
+        started = datetime.now()
+        by_login = {}
+        profiles = {}
+        by_wanted = {}
+        digests = {}
+        registered_at = {}
+        all_users = set()
+
+        for record in await self._read(self.sheet.get_all_records):
+            try:
+                user_id = int(record['user_id'])
+            except (KeyError, ValueError):
+                continue
+            all_users.add(user_id)
+            if record.get('login'):
+                by_login[record['login']] = user_id
+                profiles[record['login']] = (user_id, str(record.get('name', '')), str(record.get('telegram_username', '')))
+            if record.get('wanted'):
+                by_wanted.setdefault(record['wanted'], set()).add(user_id)
+            if record.get('digest'):
+                # В дайджест входят отслеживаемый пир и логины, указанные при подписке
+                logins = [record['wanted']] if record.get('wanted') else []
+                logins += [login for login in str(record['digest']).split() if login not in logins and login != 'on']
+                digests[user_id] = logins
+            try:
+                registered_at[user_id] = datetime.strptime(str(record.get('registered_at', '')), '%Y-%m-%d').date()
+            except ValueError:
+                pass
+
+        index = {
+            "all": all_users,
+            "by_login": by_login,
+            "by_wanted": by_wanted,
+            "digests": digests,
+            "registered_at": registered_at,
+            "profiles": profiles,
+            "sorted_logins": sorted(profiles)
+        }
+        # Не устанавливаем чтение, начатое до последней записи, и не затираем более позднее
+        if started > self._user_index_invalidated and (
+                not self._user_index_timestamp or self._user_index_timestamp <= started):
+            self._user_index = index
+            self._user_index_timestamp = started
+        return index
+
+    def _refresh_in_background(self, name, coro_factory):
+        task = self._background_refreshes.get(name)
+        if task is None or task.done():
+            async def refresh():
+                with sheets_priority(BACKGROUND):
+                    await coro_factory()
+            self._background_refreshes[name] = asyncio.create_task(refresh())
+
+    def peek_user_index(self):
+        """Последний построенный индекс без обращения к таблице; если он устарел — обновляется в фоне."""
+        if not self._user_index_is_fresh():
+            self._refresh_in_background("user_index", self._load_user_index)
+        return self._user_index
+
+    def peek_campus_seats(self) -> dict:
+        """Места пиров (login -> место) из кэша кампусов без запросов к API; устаревший кэш обновляется в фоне."""
+        now = datetime.now()
+        seats = {}
+        for campus_id in self.campus_ids:
+            timestamp = self._cache_timestamp.get(campus_id)
+            if not timestamp or (now - timestamp).total_seconds() >= self._max_cache_seconds:
+                self._refresh_in_background("campus", self.get_all_campus_data)
+            seats.update(self._campus_data_cache.get(campus_id, {}).get("seats", {}))
+        return seats
+
+    async def resolve_audience(self, filters) -> set:
+        """Пересечение аудиторий по фильтрам вида (kind, arg); без фильтров — все пользователи."""
+        index = await self.get_user_index()
+        audience = set(index["all"])
 
+        for kind, arg in filters:
+            if kind == "campus":
+                present = await self.get_present_logins()
+                audience &= {index["by_login"][login] for login in present if login in index["by_login"]}
+            elif kind == "wanted":
+                audience &= index["by_wanted"].get(arg, set())
+            elif kind == "after":
+                audience &= {user_id for user_id, date in index["registered_at"].items() if date > arg}
+            elif kind == "logins":
+                audience &= {index["by_login"][login] for login in arg if login in index["by_login"]}
+
+        return audience
+
+    @traced("sheets.get_user_record")
     async def get_user_record(self, user_id: int) -> dict:
-        all_values = self.sheet.get_all_values()
+        all_values = await self._read(self.sheet.get_all_values)
         if not all_values:
             return None
         headers = all_values[0]
@@ -191,41 +593,63 @@ class GoogleSheetsService:
                 return {header: row[i] if i < len(row) else '' for i, header in enumerate(headers)}
         return None
 
+    @traced("sheets.update_user_wanted")
     async def update_user_wanted(self, user_id: int, wanted_login: str):
         record = await self.get_user_record(user_id)
         if not record:
             return False
 
-        row_idx = list(self.sheet.col_values(1)).index(str(user_id)) + 1
-        col_idx = self.sheet.row_values(1).index('wanted') + 1 if 'wanted' in self.sheet.row_values(1) else None
+        row_idx = list(await self._read(self.sheet.col_values, 1)).index(str(user_id)) + 1
+        headers = await self._read(self.sheet.row_values, 1)
+        col_idx = headers.index('wanted') + 1 if 'wanted' in headers else None
         
         if col_idx:
-            self.sheet.update_cell(row_idx, col_idx, wanted_login)
+            await self._write(self.sheet.update_cell, row_idx, col_idx, wanted_login)
+            self._invalidate_user_index()
             
-            notified_idx = self.sheet.row_values(1).index('notified') + 1 if 'notified' in self.sheet.row_values(1) else None
+            notified_idx = headers.index('notified') + 1 if 'notified' in headers else None
             if notified_idx:
-                self.sheet.update_cell(row_idx, notified_idx, "FALSE")
+                await self._write(self.sheet.update_cell, row_idx, notified_idx, "FALSE")
             
             return True
         return False
 
+    @traced("sheets.update_user_digest")
+    async def update_user_digest(self, user_id: int, digest: str):
+        record = await self.get_user_record(user_id)
+        if not record:
+            return False
+
+        row_idx = list(await self._read(self.sheet.col_values, 1)).index(str(user_id)) + 1
+        headers = await self._read(self.sheet.row_values, 1)
+        col_idx = headers.index('digest') + 1 if 'digest' in headers else None
+
+        if col_idx:
+            await self._write(self.sheet.update_cell, row_idx, col_idx, digest)
+            self._invalidate_user_index()
+            return True
+        return False
+
+    @traced("sheets.update_user_notified")
     async def update_user_notified(self, user_id: int, notified: bool):
         record = await self.get_user_record(user_id)
         if not record:
             return False
 
-        row_idx = list(self.sheet.col_values(1)).index(str(user_id)) + 1
-        col_idx = self.sheet.row_values(1).index('notified') + 1 if 'notified' in self.sheet.row_values(1) else None
+        row_idx = list(await self._read(self.sheet.col_values, 1)).index(str(user_id)) + 1
+        headers = await self._read(self.sheet.row_values, 1)
+        col_idx = headers.index('notified') + 1 if 'notified' in headers else None
         
         if col_idx:
-            self.sheet.update_cell(row_idx, col_idx, "TRUE" if notified else "FALSE")
+            await self._write(self.sheet.update_cell, row_idx, col_idx, "TRUE" if notified else "FALSE")
             return True
         return False
 
+    @traced("sheets.get_all_tracking_users")
     async def get_all_tracking_users(self):
-        records = self.sheet.get_all_records()
+        records = await self._read(self.sheet.get_all_records)
         return [
-            (int(record['user_id']), record['wanted'])
+            (int(record['user_id']), record['wanted'], str(record['notified']).upper() == 'TRUE')
             for record in records
             if 'wanted' in record and record['wanted'] and 'notified' in record
         ]
@@ -238,23 +662,72 @@ class GoogleSheetsService:
 
             await asyncio.sleep(wait_seconds)
 
-            records = self.sheet.get_all_records()
-            for record in records:
-                if 'user_id' in record and 'notified' in record:
-                    try:
-                        user_id = int(record['user_id'])
-                        await self.update_user_notified(user_id, False)
-                    except:
-                        continue
+            with sheets_priority(BACKGROUND):
+                try:
+                    await self.reset_all_notified()
+                except:
+                    continue
+
+    async def send_digest_daily(self, bot, digest_time="21:00"):
+        hour, minute = map(int, digest_time.split(":"))
+        while True:
+            now = datetime.now()
+            next_digest = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if next_digest <= now:
+                next_digest += timedelta(days=1)
+
+            await asyncio.sleep((next_digest - now).total_seconds())
+
+            with sheets_priority(BACKGROUND):
+                try:
+                    await self.send_digests(bot)
+                except:
+                    continue
+
+    async def send_digests(self, bot, day=None):
+        index = await self._load_user_index()
+        sent = 0
+        # Одно сообщение на подписчика; отправка идёт с низшим приоритетом через общий планировщик
+        with send_priority(BROADCAST):
+            for user_id, logins in index["digests"].items():
+                if not logins or is_user_inactive(user_id):
+                    continue
+                if await deliver(bot.send_message, user_id, self.format_digest(logins, day), parse_mode="HTML"):
+                    sent += 1
+        return sent
+
+    def format_digest(self, logins, day=None):
+        day = day or datetime.now()
+        lines = [f"📋 <b>Дайджест за {day:%d.%m}</b>", ""]
+        for login in logins:
+            intervals = self.presence.intervals(login, day)
+            if not intervals:
+                lines.append(f"👤 <b>{escape(login)}</b>: не был в кампусе")
+                continue
+            total = sum(end - start for start, end in intervals)
+            spans = ", ".join(f"{_clock(start)}–{_clock(end)}" for start, end in intervals)
+            lines.append(f"👤 <b>{escape(login)}</b>: {spans} · {total // 3600} ч {total % 3600 // 60} мин")
+        return "\n".join(lines)
+
+    @traced("sheets.reset_all_notified")
+    async def reset_all_notified(self):
+        # Одна запись на весь столбец вместо нескольких запросов на каждого пользователя
+        all_values = await self._read(self.sheet.get_all_values)
+        if len(all_values) < 2 or 'notified' not in all_values[0]:
+            return
+        col = all_values[0].index('notified') + 1
+        cell_range = f"{rowcol_to_a1(2, col)}:{rowcol_to_a1(len(all_values), col)}"
+        await self._write(self.sheet.update, range_name=cell_range, values=[["FALSE"] for _ in all_values[1:]])
 
     async def initialize(self):
         try:
-            headers = self.sheet.row_values(1)
+            headers = await self._read(self.sheet.row_values, 1)
             if not headers:
-                self.sheet.update('A1', [['user_id', 'login', 'name', 'telegram_username', 'wanted', 'notified']])
-                headers = self.sheet.row_values(1)
+                await self._write(self.sheet.update, range_name='A1',
+                                  values=[['user_id', 'login', 'name', 'telegram_username', 'wanted', 'notified']])
+                headers = await self._read(self.sheet.row_values, 1)
 
-            new_columns = {'wanted': '', 'notified': 'FALSE'}
+            new_columns = {'wanted': '', 'notified': 'FALSE', 'registered_at': '', 'digest': ''}
             update_needed = False
 
             for col in new_columns:
@@ -263,7 +736,7 @@ class GoogleSheetsService:
                     update_needed = True
 
             if update_needed:
-                self.sheet.update([headers], 'A1')
+                await self._write(self.sheet.update, range_name='A1', values=[headers])
                 
         except Exception as e:
             raise e
\ No newline at end of file
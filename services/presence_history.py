@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+
+PRESENCE_HISTORY_FILE = "presence_history.json"
+
+class PresenceHistory:
+    """История присутствия пиров в кампусе по результатам опросов карты кластеров.
+
+    Для каждого дня хранит интервалы [приход, уход] в секундах от полуночи.
+    Если пир пропал из карты меньше чем на max_gap_seconds, интервал продолжается.
+    """
+
+    def __init__(self, path=PRESENCE_HISTORY_FILE, max_gap_seconds=15 * 60, keep_days=2):
+        self.path = path
+        self.max_gap_seconds = max_gap_seconds
+        self.keep_days = keep_days
+        try:
+            with open(self.path, "r") as file:
+                self._days = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self._days = {}
+
+    def record(self, present_logins, now=None):
+        now = now or datetime.now()
+        day = self._days.setdefault(now.strftime("%Y-%m-%d"), {})
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+
+        for login in present_logins:
+            intervals = day.setdefault(login, [])
+            if intervals and seconds - intervals[-1][1] <= self.max_gap_seconds:
+                intervals[-1][1] = seconds
+            else:
+                intervals.append([seconds, seconds])
+
+        for old_day in sorted(self._days)[:-self.keep_days]:
+            del self._days[old_day]
+        self._save()
+
+    def _save(self):
+        with open(self.path, "w") as file:
+            json.dump(self._days, file)
+
+    def intervals(self, login, day=None):
+        day = (day or datetime.now()).strftime("%Y-%m-%d")
+        return [tuple(interval) for interval in self._days.get(day, {}).get(login, [])]
@@ -0,0 +1,124 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from gspread.exceptions import APIError
+
+# Приоритеты запросов к таблице: пользовательские идут раньше фоновых
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_sheets_priority = ContextVar("sheets_priority", default=INTERACTIVE)
+
+@contextmanager
+def sheets_priority(priority):
+    token = _sheets_priority.set(priority)
+    try:
+        yield
+    finally:
+        _sheets_priority.reset(token)
+
+class SheetsScheduler:
+    """Очередь вызовов gspread с учётом минутных квот Google Sheets.
+
+    Для чтения и записи своё скользящее окно в window_seconds: в любом окне
+    уходит не больше квоты, даже после простоя. Разрешения по приоритету
+    выдаёт один воркер на вид запроса. Фоновые задачи не трогают последние
+    background_reserve квоты, чтобы её всегда хватало пользователям.
+    На 429 отправка этого вида ставится на паузу и запрос повторяется с backoff.
+    Сами вызовы gspread выполняются в пуле потоков и не блокируют event loop.
+    """
+
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, background_reserve=0.2,
+                 max_retries=5, window_seconds=60):
+        self._quota = {"read": reads_per_minute, "write": writes_per_minute}
+        self._reserve = {
+            kind: min(int(quota * background_reserve), quota - 1) for kind, quota in self._quota.items()
+        }
+        self._spent = {kind: deque() for kind in self._quota}
+        self._waiters = {kind: [] for kind in self._quota}
+        self._wakeup = {kind: asyncio.Event() for kind in self._quota}
+        self._workers = {kind: None for kind in self._quota}
+        self._paused_until = {kind: 0 for kind in self._quota}
+        self._seq = itertools.count()
+        self.max_retries = max_retries
+        self.window_seconds = window_seconds
+        self.throttled = {kind: 0 for kind in self._quota}
+
+    def _expire(self, kind, now):
+        spent = self._spent[kind]
+        while spent and spent[0] <= now - self.window_seconds:
+            spent.popleft()
+        return spent
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        result = {}
+        for kind, quota in self._quota.items():
+            result[kind] = {
+                "remaining": quota - len(self._expire(kind, now)),
+                "per_minute": quota,
+                "waiting": len(self._waiters[kind]),
+                "throttled": self.throttled[kind]
+            }
+        return result
+
+    async def _acquire(self, kind, priority):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[kind].append((priority, next(self._seq), future))
+        worker = self._workers[kind]
+        if worker is None or worker.done():
+            self._workers[kind] = asyncio.create_task(self._run(kind))
+        self._wakeup[kind].set()
+        await future
+
+    async def _sleep(self, kind, seconds):
+        # Просыпаемся раньше, если пришёл новый запрос: он может оказаться приоритетнее
+        self._wakeup[kind].clear()
+        try:
+            await asyncio.wait_for(self._wakeup[kind].wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, kind):
+        while True:
+            waiters = self._waiters[kind] = [waiter for waiter in self._waiters[kind] if not waiter[2].done()]
+            if not waiters:
+                self._wakeup[kind].clear()
+                await self._wakeup[kind].wait()
+                continue
+
+            now = time.monotonic()
+            if now < self._paused_until[kind]:
+                await asyncio.sleep(self._paused_until[kind] - now)
+                continue
+
+            best = min(waiters)
+            limit = self._quota[kind] - (self._reserve[kind] if best[0] != INTERACTIVE else 0)
+            spent = self._expire(kind, now)
+            if len(spent) >= limit:
+                # Ждём, пока из окна выйдет столько запросов, чтобы освободилось место
+                await self._sleep(kind, spent[len(spent) - limit] + self.window_seconds - now)
+                continue
+
+            waiters.remove(best)
+            spent.append(now)
+            best[2].set_result(None)
+
+    async def run(self, kind, func, *args, **kwargs):
+        priority = _sheets_priority.get()
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(kind, priority)
+            try:
+                return await asyncio.to_thread(func, *args, **kwargs)
+            except APIError as e:
+                if e.response.status_code != 429 or attempt == self.max_retries:
+                    raise
+                # Квота исчерпана раньше, чем думали: ставим этот вид запросов на паузу
+                self.throttled[kind] += 1
+                delay = 2 ** attempt
+                self._paused_until[kind] = max(self._paused_until[kind],
+                                               time.monotonic() + delay + random.uniform(0, delay))
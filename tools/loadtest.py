@@ -0,0 +1,284 @@
+"""Нагрузочный тест обработчиков бота.
+
+Гоняет синтетические апдейты через dp.feed_update с заданной частотой.
+Вместо Telegram используется фейковая сессия Bot с теми же middleware,
+что и в main.py (трассировка, лимиты исходящих), вместо Google Sheets —
+таблица в памяти, вместо School API — сгенерированные ответы.
+В конце печатает пропускную способность и p50/p95/p99 по каждому шагу.
+
+Запуск из корня репозитория:
+    python -m tools.loadtest --rate 50 --duration 30
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import string
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, MessageId, Update
+from handlers.handlers import dp
+from services.google_sheets_service import GoogleSheetsService
+from services.sheets_scheduler import SheetsScheduler
+from utils.helpers import setup_middlewares
+from config import SLOW_UPDATE_MS
+
+BOT_ID = 100000
+HEADERS = ['user_id', 'login', 'name', 'telegram_username', 'wanted', 'notified', 'registered_at']
+
+def random_login():
+    return "".join(random.choices(string.ascii_lowercase, k=8))
+
+class FakeSession(BaseSession):
+    """Сессия Bot, которая ничего не отправляет, а только считает вызовы."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = getattr(method, "__returning__", None)
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None)
+            )
+        if returning is MessageId:
+            return MessageId(message_id=next(self._message_ids))
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+class FakeSheet:
+    """Лист gspread в памяти. Задержка блокирующая, как у настоящего gspread."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.rows = [list(HEADERS)]
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_all_records(self):
+        self._wait()
+        records = []
+        for row in self.rows[1:]:
+            record = dict(zip(self.rows[0], row))
+            record['user_id'] = int(record['user_id'])
+            records.append(record)
+        return records
+
+    def get_all_values(self):
+        self._wait()
+        return [[str(value) for value in row] for row in self.rows]
+
+    def row_values(self, row):
+        self._wait()
+        return [str(value) for value in self.rows[row - 1]]
+
+    def col_values(self, col):
+        self._wait()
+        return [str(row[col - 1]) for row in self.rows]
+
+    def update_cell(self, row, col, value):
+        self._wait()
+        self.rows[row - 1][col - 1] = value
+
+    def append_row(self, values):
+        self._wait()
+        self.rows.append(list(values))
+
+    def update(self, *args, **kwargs):
+        self._wait()
+
+class FakeSchoolService(GoogleSheetsService):
+    """Сервис с настоящей логикой кэшей поверх фейковых таблицы и School API."""
+
+    def __init__(self, sheet, present_logins, api_latency, sheets_quota):
+        super().__init__(None, None, None, None, sheet=sheet,
+                         sheets_scheduler=SheetsScheduler(sheets_quota, sheets_quota))
+        self.present_logins = present_logins
+        self.api_latency = api_latency
+
+    async def get_access_token(self):
+        return "token"
+
+    async def _api_get(self, session, url, headers):
+        await asyncio.sleep(self.api_latency)
+        if url.endswith("/map"):
+            return 200, {"clusterMap": [
+                {"login": login, "row": random.choice("abcdef"), "number": random.randint(1, 12)}
+                for login in random.sample(self.present_logins, k=min(10, len(self.present_logins)))
+            ]}
+        if url.endswith("/coalition"):
+            return 200, {"name": "Load"}
+        if "/participants/" in url:
+            return 200, {"login": url.rsplit("/", 1)[-1], "level": 1, "campus": {"shortName": "Load"}}
+        return 404, None
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.session = FakeSession(args.bot_latency_ms / 1000)
+        self.bot = Bot(token="123456789:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA", session=self.session)
+        self.sheet = FakeSheet(args.sheets_latency_ms / 1000)
+        self.update_ids = itertools.count(1)
+        self.user_ids = itertools.count(1000)
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+        self.registered = []
+        for _ in range(args.users):
+            user_id = next(self.user_ids)
+            login = random_login()
+            self.sheet.rows.append([user_id, login, "Load", f"user{user_id}", "", "FALSE", "2025-09-01"])
+            self.registered.append((user_id, login))
+
+        present = [login for _, login in random.sample(self.registered, k=min(40, len(self.registered)))]
+        self.service = FakeSchoolService(self.sheet, present, args.api_latency_ms / 1000, args.sheets_quota)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"user{user_id}"}
+
+    def message_update(self, user_id, text):
+        update_id = next(self.update_ids)
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.model_validate({"update_id": update_id, "message": message}, context={"bot": self.bot})
+
+    def callback_update(self, user_id, data):
+        update_id = next(self.update_ids)
+        return Update.model_validate({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bot"},
+                    "text": "menu"
+                }
+            }
+        }, context={"bot": self.bot})
+
+    async def feed(self, label, update):
+        start = time.perf_counter()
+        try:
+            await dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors[f"{label}: {type(e).__name__}"] += 1
+        self.latencies[label].append((time.perf_counter() - start) * 1000)
+
+    # Сценарии: каждый — последовательность апдейтов одного пользователя
+    async def scenario_start(self):
+        user_id, _ = random.choice(self.registered)
+        await self.feed("/start", self.message_update(user_id, "/start"))
+
+    async def scenario_campus(self):
+        user_id, _ = random.choice(self.registered)
+        await self.feed("/campus", self.message_update(user_id, "/campus"))
+
+    async def scenario_search(self):
+        user_id, _ = random.choice(self.registered)
+        _, login = random.choice(self.registered)
+        await self.feed("/search", self.message_update(user_id, f"/search {login}"))
+
+    async def scenario_links(self):
+        user_id, _ = random.choice(self.registered)
+        await self.feed("callback:links", self.callback_update(user_id, "links"))
+        await self.feed("callback:faq", self.callback_update(user_id, "faq"))
+
+    async def scenario_registration(self):
+        user_id = next(self.user_ids)
+        await self.feed("callback:register", self.callback_update(user_id, "register"))
+        await self.feed("fsm:login", self.message_update(user_id, random_login()))
+        await self.feed("fsm:name", self.message_update(user_id, "Нагрузка"))
+
+    async def run(self):
+        dp["google_sheets_service"] = self.service
+        dp["main_admin_id"] = 0
+        dp.bot = self.bot
+        # Тот же конвейер, что и в main.py: трассировка и планировщик исходящих с лимитами Telegram
+        setup_middlewares(dp, self.bot, self.args.slow_update_ms)
+
+        scenarios = [
+            self.scenario_start,
+            self.scenario_campus,
+            self.scenario_search,
+            self.scenario_links,
+            self.scenario_registration
+        ]
+        interval = 1 / self.args.rate
+        tasks = []
+        started = time.perf_counter()
+        next_at = started
+        while time.perf_counter() - started < self.args.duration:
+            tasks.append(asyncio.create_task(random.choice(scenarios)()))
+            next_at += interval
+            await asyncio.sleep(max(0, next_at - time.perf_counter()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        await self.bot.session.close()
+        self.report(elapsed)
+
+    def report(self, elapsed):
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"Апдейтов: {total} за {elapsed:.1f} с — {total / elapsed:.1f} апд/с "
+              f"(цель {self.args.rate} сценариев/с)")
+        print(f"{'шаг':<20}{'n':>7}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+        for label, values in sorted(self.latencies.items()):
+            values.sort()
+            print(f"{label:<20}{len(values):>7}"
+                  f"{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}"
+                  f"{percentile(values, 99):>10.1f}{values[-1]:>10.1f}")
+        print("Вызовы Bot API: " + ", ".join(f"{name} {count}" for name, count in self.session.calls.most_common()))
+        if self.errors:
+            print("Ошибки: " + ", ".join(f"{name} {count}" for name, count in self.errors.most_common()))
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))
+    return sorted_values[index]
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--rate", type=float, default=20, help="сценариев в секунду")
+    parser.add_argument("--duration", type=float, default=10, help="длительность, с")
+    parser.add_argument("--users", type=int, default=500, help="зарегистрированных пользователей в таблице")
+    parser.add_argument("--sheets-latency-ms", type=float, default=150, help="блокирующая задержка вызова gspread")
+    parser.add_argument("--sheets-quota", type=int, default=60, help="квота Google Sheets на чтение и запись в минуту")
+    parser.add_argument("--api-latency-ms", type=float, default=200, help="задержка запроса к School API")
+    parser.add_argument("--bot-latency-ms", type=float, default=50, help="задержка запроса к Bot API")
+    parser.add_argument("--slow-update-ms", type=int, default=SLOW_UPDATE_MS, help="порог лога медленных апдейтов")
+    asyncio.run(LoadTest(parser.parse_args()).run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+INACTIVE_USERS_FILE = "inactive_users.txt"
+MAX_DELIVERY_FAILURES = 3
+
+# user_id -> число неудачных доставок подряд
+_failures = {}
+_inactive_users = None
+
+def _load_inactive_users():
+    global _inactive_users
+    if _inactive_users is None:
+        try:
+            with open(INACTIVE_USERS_FILE, "r") as file:
+                _inactive_users = set(map(int, file.read().splitlines()))
+        except FileNotFoundError:
+            _inactive_users = set()
+    return _inactive_users
+
+def _save_inactive_users():
+    with open(INACTIVE_USERS_FILE, "w") as file:
+        file.write("\n".join(map(str, _load_inactive_users())))
+
+def is_unreachable_error(error):
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in str(error).lower()
+
+def is_user_inactive(user_id):
+    return user_id in _load_inactive_users()
+
+def inactive_users_count():
+    return len(_load_inactive_users())
+
+def filter_active(user_ids):
+    inactive = _load_inactive_users()
+    return [user_id for user_id in user_ids if user_id not in inactive]
+
+def record_delivery_success(user_id):
+    _failures.pop(user_id, None)
+
+def record_delivery_failure(user_id, error):
+    if not is_unreachable_error(error):
+        return
+    _failures[user_id] = _failures.get(user_id, 0) + 1
+    if _failures[user_id] >= MAX_DELIVERY_FAILURES and not is_user_inactive(user_id):
+        _load_inactive_users().add(user_id)
+        _save_inactive_users()
+
+def reactivate_user(user_id):
+    _failures.pop(user_id, None)
+    if is_user_inactive(user_id):
+        _load_inactive_users().discard(user_id)
+        _save_inactive_users()
+
+async def deliver(send, user_id, *args, **kwargs):
+    """Отправляет сообщение через send(user_id, ...), пропуская недоступных пользователей.
+
+    Возвращает True при успешной доставке.
+    """
+    if is_user_inactive(user_id):
+        return False
+    try:
+        await send(user_id, *args, **kwargs)
+    except Exception as e:
+        record_delivery_failure(user_id, e)
+        return False
+    record_delivery_success(user_id)
+    return True
@@ -1,7 +1,15 @@
+import re
+import time
+from datetime import datetime
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, BotCommand
 from aiogram import Bot
+from functools import lru_cache
+from utils.links import link_catalog
+from utils.tracing import TracingMiddleware, BotApiTracingMiddleware
+from utils.outbound import OutboundMiddleware, outbound_scheduler
 
 # Keyboards
+@lru_cache(maxsize=None)
 def menu_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Регистрация 📝", callback_data="register")],
@@ -13,37 +21,28 @@ def menu_keyboard():
     ])
 
 def links_keyboard():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="FAQ Школы 21 🧠", callback_data="faq")],
-        [InlineKeyboardButton(text="Правила Школы 21 📖", callback_data="rules")],
-        [InlineKeyboardButton(text="Правила Рокетчата 🚀", callback_data="rocketchat")],
-        [InlineKeyboardButton(text="Гайд по стажировке 📘", callback_data="internship_guide")],
-        [InlineKeyboardButton(text="Список специальностей 📕", callback_data="specialties")],
-        [InlineKeyboardButton(text="GigaCode 🤖", callback_data="gigacode")],
-        [InlineKeyboardButton(text="Правила онлайн проверок 🤼‍♂️", callback_data="p2p")],
-        [InlineKeyboardButton(text="Выпуск школы 🎓", callback_data="final")],
-        [InlineKeyboardButton(text="Как получить коины 💰", callback_data="coins")],
-        [InlineKeyboardButton(text="Форма гостя 🎫", callback_data="guests")],
-        [InlineKeyboardButton(text="Почта якутского кампуса", callback_data="email")],
-        [InlineKeyboardButton(text="Назад ↩️", callback_data="back")]
-    ])
+    return link_catalog.keyboard()
 
+@lru_cache(maxsize=None)
 def registration_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Регистрация", callback_data="register")]
     ])
 
+@lru_cache(maxsize=None)
 def re_registration_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Да", callback_data="re_register")],
         [InlineKeyboardButton(text="Нет", callback_data="cancel")]
     ])
 
+@lru_cache(maxsize=None)
 def cancel_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="Отмена", callback_data="cancel")]]
     )
 
+@lru_cache(maxsize=None)
 def broadcast_decision_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[[
@@ -92,6 +91,64 @@ async def check_ban(user_id: int, message: Message = None, callback = None):
         return True
     return False
 
+MAX_LOGINS_PER_REQUEST = 10
+PING_COOLDOWN_SECONDS = 600
+
+# (sender_id, recipient_id) -> время последнего пинга
+_last_pings = {}
+
+TOO_MANY_LOGINS = f"Не больше {MAX_LOGINS_PER_REQUEST} логинов за раз ❌\nРазбейте список на несколько запросов"
+
+def parse_logins(text):
+    logins = []
+    for login in re.split(r'[\s,;]+', text.strip().lower()):
+        if login and login not in logins:
+            logins.append(login)
+    return logins
+
+AUDIENCE_HELP = """Аудитория рассылки (фильтры через «;» пересекаются):
+• без аргументов — все пользователи
+• campus — кто сейчас в кампусе
+• wanted <логин> — кто отслеживает пира
+• after <ГГГГ-ММ-ДД> — зарегистрированные после даты
+• logins <логин> <логин> ... — явный список"""
+
+def parse_audience(text):
+    filters = []
+    for clause in (text or '').split(';'):
+        kind, _, arg = clause.strip().partition(' ')
+        kind, arg = kind.lower(), arg.strip()
+        if not kind:
+            continue
+        if kind == 'campus' and not arg:
+            filters.append(('campus', None))
+        elif kind == 'wanted' and arg:
+            filters.append(('wanted', arg.lower()))
+        elif kind == 'after' and arg:
+            filters.append(('after', datetime.strptime(arg, '%Y-%m-%d').date()))
+        elif kind == 'logins' and arg:
+            filters.append(('logins', parse_logins(arg)))
+        else:
+            raise ValueError(clause.strip())
+    return filters
+
+def ping_cooldown_left(sender_id, recipient_id):
+    last_ping = _last_pings.get((sender_id, recipient_id))
+    if last_ping is None:
+        return 0
+    return max(0, int(last_ping + PING_COOLDOWN_SECONDS - time.monotonic()))
+
+def register_ping(sender_id, recipient_id):
+    now = time.monotonic()
+    _last_pings[(sender_id, recipient_id)] = now
+    if len(_last_pings) > 10000:
+        for pair, last_ping in list(_last_pings.items()):
+            if now - last_ping >= PING_COOLDOWN_SECONDS:
+                del _last_pings[pair]
+
+def release_ping(sender_id, recipient_id):
+    _last_pings.pop((sender_id, recipient_id), None)
+
 async def send_media_preview(media_message: Message, chat_id: int):
     if media_message.text:
         await media_message.bot.send_message(chat_id, media_message.text)
@@ -110,5 +167,15 @@ async def set_main_menu(bot: Bot):
         BotCommand(command='/campus', description='Кто в кампусе 👀'),
         BotCommand(command='/ref', description='Реферальная ссылка ✉️'),
         BotCommand(command='/wanted', description='Отслеживать пира 🐈'),
+        BotCommand(command='/profile', description='Профиль пира на платформе 🎓'),
+        BotCommand(command='/digest', description='Ежедневный дайджест по пирам 📋'),
     ]
-    await bot.set_my_commands(main_menu_commands)
\ No newline at end of file
+    await bot.set_my_commands(main_menu_commands)
+
+def setup_middlewares(dp, bot: Bot, slow_update_ms: int):
+    # Трассировка апдейтов и вызовов Bot API
+    dp.update.outer_middleware(TracingMiddleware(slow_update_ms))
+    bot.session.middleware(BotApiTracingMiddleware())
+
+    # Все исходящие сообщения проходят через общий планировщик с лимитами Telegram
+    bot.session.middleware(OutboundMiddleware(outbound_scheduler))
@@ -0,0 +1,58 @@
+import json
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+LINKS_FILE = "links.json"
+
+# callback_data кнопок самого бота: ссылка с таким ключом перехватила бы их обработчики
+RESERVED_KEYS = frozenset({
+    "back", "broadcast_cancel", "broadcast_confirm", "campus", "cancel",
+    "links", "ping", "re_register", "ref", "register", "search"
+})
+
+class LinkCatalog:
+    """Каталог полезных ссылок из links.json.
+
+    Клавиатура и ответы строятся один раз при загрузке: при старте
+    и по команде /reload_links, — без перезапуска бота. Поиск ответа
+    по нажатой кнопке — обычный поиск в словаре, без обращений к диску.
+    """
+
+    def __init__(self, path=LINKS_FILE):
+        self.path = path
+        self._replies = {}
+        self._keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="Назад ↩️", callback_data="back")]
+        ])
+        try:
+            self.load()
+        except (OSError, ValueError, KeyError, TypeError):
+            # Без файла бот работает с пустым каталогом до /reload_links
+            pass
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as file:
+            links = json.load(file)
+
+        replies = {}
+        rows = []
+        for link in links:
+            if link["key"] in RESERVED_KEYS:
+                raise ValueError(f"ключ {link['key']!r} занят кнопкой бота")
+            replies[link["key"]] = link["text"]
+            rows.append([InlineKeyboardButton(text=link["button"], callback_data=link["key"])])
+        rows.append([InlineKeyboardButton(text="Назад ↩️", callback_data="back")])
+
+        self._replies = replies
+        self._keyboard = InlineKeyboardMarkup(inline_keyboard=rows)
+        return len(replies)
+
+    def __contains__(self, key):
+        return key in self._replies
+
+    def reply(self, key):
+        return self._replies.get(key)
+
+    def keyboard(self):
+        return self._keyboard
+
+link_catalog = LinkCatalog()
@@ -0,0 +1,150 @@
+import asyncio
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+# Классы приоритета: чем меньше, тем раньше уходит сообщение
+INTERACTIVE = 0
+NOTIFICATION = 1
+BROADCAST = 2
+
+_send_priority = ContextVar("send_priority", default=INTERACTIVE)
+
+@contextmanager
+def send_priority(priority):
+    token = _send_priority.set(priority)
+    try:
+        yield
+    finally:
+        _send_priority.reset(token)
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class OutboundScheduler:
+    """Единая очередь исходящих сообщений.
+
+    Держит общий лимит Bot API и лимит на чат, выдаёт разрешения на отправку
+    по приоритету и при flood wait ставит на паузу всю отправку.
+    """
+
+    def __init__(self, global_rate=25, chat_rate=1, chat_burst=3):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._paused_until = 0
+        self._worker = None
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id, priority):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((priority, next(self._seq), chat_id, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+        await future
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                now = time.monotonic()
+                self._chats = {
+                    key: value for key, value in self._chats.items()
+                    if value.wait_time(now) > 0 or value.tokens < value.capacity
+                }
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _sleep(self, seconds):
+        # Просыпаемся раньше, если пришёл новый запрос
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            self._waiters = [waiter for waiter in self._waiters if not waiter[3].done()]
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            global_wait = self._global.wait_time(now)
+            if global_wait:
+                await asyncio.sleep(global_wait)
+                continue
+
+            # Самый приоритетный запрос среди чатов, которые не упёрлись в свой лимит
+            best = None
+            chat_wait = None
+            for waiter in self._waiters:
+                wait = self._chat_bucket(waiter[2]).wait_time(now)
+                if wait:
+                    chat_wait = wait if chat_wait is None else min(chat_wait, wait)
+                elif best is None or waiter[:2] < best[:2]:
+                    best = waiter
+
+            if best is None:
+                await self._sleep(chat_wait)
+                continue
+
+            self._waiters.remove(best)
+            self._global.take()
+            self._chat_bucket(best[2]).take()
+            best[3].set_result(None)
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """Пропускает через планировщик все методы Bot API, адресованные чату."""
+
+    def __init__(self, scheduler, max_retries=3):
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = _send_priority.get()
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.scheduler.pause(e.retry_after)
+                if attempt == self.max_retries:
+                    raise
+
+outbound_scheduler = OutboundScheduler()
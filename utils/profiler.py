@@ -0,0 +1,64 @@
+import sys
+import threading
+from collections import Counter
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер главного потока (где крутится event loop).
+
+    Раз в interval секунд снимает стек и считает одинаковые стеки.
+    """
+
+    def __init__(self, interval=0.01, max_depth=30):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks = Counter()
+        self._samples = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return False
+        self._stacks.clear()
+        self._samples = 0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stop_event.set()
+        self._thread.join()
+        return True
+
+    def _run(self):
+        target_id = threading.main_thread().ident
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(target_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    def report(self, limit=10):
+        if not self._samples:
+            return "Нет сэмплов"
+        lines = [f"Сэмплов: {self._samples}"]
+        for stack, count in self._stacks.most_common(limit):
+            # Показываем только вершину стека: там и тратится время
+            top = stack.split(";")[-3:]
+            lines.append(f"{count * 100 / self._samples:.1f}%  " + " ← ".join(reversed(top)))
+        return "\n".join(lines)
+
+profiler = SamplingProfiler()
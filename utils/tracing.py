@@ -0,0 +1,68 @@
+import functools
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Спаны текущего апдейта: список (имя, длительность в мс)
+_current_spans = ContextVar("current_spans", default=None)
+
+@asynccontextmanager
+async def span(name):
+    spans = _current_spans.get()
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, (time.perf_counter() - start) * 1000))
+
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def describe_update(update):
+    event_type = getattr(update, "event_type", "update")
+    if update.message and update.message.text:
+        return f"{event_type} {update.message.text.split()[0][:32]}"
+    if update.callback_query:
+        return f"{event_type} {update.callback_query.data}"
+    return event_type
+
+class TracingMiddleware(BaseMiddleware):
+    """Замеряет каждый апдейт и пишет в лог разбивку по спанам для медленных."""
+
+    def __init__(self, slow_update_ms):
+        self.slow_update_ms = slow_update_ms
+
+    async def __call__(self, handler, event, data):
+        spans = []
+        token = _current_spans.set(spans)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            _current_spans.reset(token)
+            if total_ms >= self.slow_update_ms:
+                breakdown = ", ".join(f"{name} {ms:.0f} ms" for name, ms in spans) or "нет спанов"
+                logger.warning("Slow update %s (%s): %.0f ms: %s",
+                               event.update_id, describe_update(event), total_ms, breakdown)
+
+class BotApiTracingMiddleware(BaseRequestMiddleware):
+    """Оборачивает каждый вызов Bot API в спан bot.<метод>."""
+
+    async def __call__(self, make_request, bot, method):
+        async with span(f"bot.{type(method).__name__}"):
+            return await make_request(bot, method)